@@ -5,24 +5,29 @@ Syncs meditation data between Beeminder goals and a local source of truth databa
 """
 
 import os
-import json
+import logging
+import orjson
 import requests
 import re
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
-import pytz
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger('beeminder_sync')
+
+# KEY=value lines of a .env file; blank lines, comments and lines without '=' don't match
+_ENV_LINE_RE = re.compile(r'^[ \t]*([^#=\s][^=\n]*)=(.*?)[ \t\r]*$', re.M)
 
 # Load environment variables manually from .env file
 def load_env():
     env_path = '.env'
     if os.path.exists(env_path):
         with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value
+            os.environ.update(_ENV_LINE_RE.findall(f.read()))
 
 load_env()
 
@@ -32,57 +37,152 @@ BEEMINDER_AUTH_TOKEN = os.getenv('BEEMINDER_AUTH_TOKEN')
 BEEMINDER_GOAL_SLUG = os.getenv('BEEMINDER_GOAL_SLUG', 'meditate-early')
 BEEMINDER_SOURCE_GOAL = os.getenv('BEEMINDER_SOURCE_GOAL_SLUG', 'meditatev4')
 
+# Logging configuration (set LOGLEVEL=DEBUG for per-datapoint diagnostics)
+LOG_LEVEL = os.getenv('LOGLEVEL', 'INFO').upper()
+
 # Database configuration
 DB_PATH = Path('data/meditation_sot.json')
 
+# Cached Beeminder pages live apart from the tracked database so they never
+# bloat or churn it
+HTTP_CACHE_PATH = Path('data/http_cache.json')
+
+# Only source datapoints from the last few days are considered for qualifying
+LOOKBACK_DAYS = 2
+
+# Maximum number of concurrent Beeminder API requests
+MAX_WORKERS = 8
+
+# Maximum number of datapoint pages fetched concurrently for one goal
+PAGE_WORKERS = 4
+
+# Retry policy for transient Beeminder failures. POST is left out: a retried
+# add whose first attempt did land would create a duplicate datapoint.
+RETRY_POLICY = Retry(
+    total=5,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=['GET', 'DELETE']
+)
+
 # Timezone configuration
-NYC_TZ = pytz.timezone('America/New_York')
+NYC_TZ = ZoneInfo('America/New_York')
+
+# Apple Health fulltext pattern: "YYYY-Mon-DD entered at HH:MM"
+_APPLE_HEALTH_RE = re.compile(r'(\d{4})-([A-Za-z]{3})-(\d{2}) entered at (\d{2}):(\d{2})')
+
+# Month abbreviation to number
+_MONTH_MAP = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
 
 class BeeminderAPI:
     """Handle Beeminder API interactions"""
 
-    def __init__(self, username: str, auth_token: str):
+    def __init__(self, username: str, auth_token: str, http_cache: Optional[Dict] = None):
         self.username = username
         self.auth_token = auth_token
         self.base_url = 'https://www.beeminder.com/api/v1'
+        # Shared session keeps connections alive between calls and retries transient errors
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS,
+                              max_retries=RETRY_POLICY)
+        self.session.mount('https://', adapter)
+        # Validators and bodies of previously fetched pages: {goal_slug: {page: {...}}}
+        self.http_cache = http_cache if http_cache is not None else {}
+
+    def _fetch_page(self, goal_slug: str, page: int, per_page: int) -> List[Dict]:
+        """Fetch one page of datapoints, revalidating against the cached copy"""
+        url = f"{self.base_url}/users/{self.username}/goals/{goal_slug}/datapoints.json"
+        params = {
+            'auth_token': self.auth_token,
+            'page': page,
+            'per_page': per_page
+        }
 
-    def get_goal_data(self, goal_slug: str) -> List[Dict]:
-        """Get all datapoints for a specific goal with pagination support"""
-        all_datapoints = []
-        page = 1
-        per_page = 300  # Maximum allowed by Beeminder API
-
-        while True:
-            url = f"{self.base_url}/users/{self.username}/goals/{goal_slug}/datapoints.json"
-            params = {
-                'auth_token': self.auth_token,
-                'page': page,
-                'per_page': per_page
+        # JSON object keys are strings, so pages are cached under str(page)
+        cached = self.http_cache.get(goal_slug, {}).get(str(page))
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(url, params=params, headers=headers)
+        if cached and response.status_code == 304:
+            return cached['body']
+
+        response.raise_for_status()
+        page_data = response.json()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not page_data:
+            # Pages past the end (often requested speculatively) are not worth keeping
+            self.http_cache.get(goal_slug, {}).pop(str(page), None)
+        elif etag or last_modified:
+            self.http_cache.setdefault(goal_slug, {})[str(page)] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'body': page_data
             }
+        return page_data
 
-            try:
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                page_data = response.json()
+    def iter_goal_data(self, goal_slug: str) -> Iterator[Dict]:
+        """Yield all datapoints for a specific goal, one page at a time
 
-                if not page_data:  # No more data
+        The first page is fetched on its own. If it is full, the following
+        pages are requested PAGE_WORKERS at a time and yielded in page order.
+        """
+        total = 0
+        page = 1
+        per_page = 300  # Maximum allowed by Beeminder API
+        batch_size = 1
+
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+            while True:
+                pages = range(page, page + batch_size)
+                futures = [executor.submit(self._fetch_page, goal_slug, p, per_page) for p in pages]
+                last_page_reached = False
+
+                for current, future in zip(pages, futures):
+                    try:
+                        page_data = future.result()
+                    except requests.exceptions.RequestException as e:
+                        logger.error("Error fetching goal data for %s (page %s): %s", goal_slug, current, e)
+                        last_page_reached = True
+                        break
+
+                    total += len(page_data)
+                    yield from page_data
+
+                    # If we got less than per_page (or nothing), we're done
+                    if len(page_data) < per_page:
+                        last_page_reached = True
+                        break
+
+                    logger.debug("Fetched page %s for %s: %s datapoints", current, goal_slug, len(page_data))
+
+                if last_page_reached:
+                    # Drop speculative requests for pages past the end
+                    for future in futures:
+                        future.cancel()
                     break
 
-                all_datapoints.extend(page_data)
-
-                # If we got less than per_page, we're done
-                if len(page_data) < per_page:
-                    break
+                page += batch_size
+                batch_size = PAGE_WORKERS
 
-                page += 1
-                print(f"Fetched page {page-1} for {goal_slug}: {len(page_data)} datapoints")
+        logger.info("Total datapoints fetched for %s: %s", goal_slug, total)
 
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching goal data for {goal_slug} (page {page}): {e}")
-                break
+    def get_goal_data(self, goal_slug: str) -> List[Dict]:
+        """Get all datapoints for a specific goal with pagination support"""
+        return list(self.iter_goal_data(goal_slug))
 
-        print(f"Total datapoints fetched for {goal_slug}: {len(all_datapoints)}")
-        return all_datapoints
+    def prefetch(self, goal_slug: str, executor: ThreadPoolExecutor) -> Future:
+        """Start fetching all datapoints for a goal in the background"""
+        return executor.submit(self.get_goal_data, goal_slug)
 
     def add_datapoint(self, goal_slug: str, value: float, timestamp: int, comment: str = "") -> bool:
         """Add a datapoint to a goal"""
@@ -95,12 +195,12 @@ class BeeminderAPI:
         }
 
         try:
-            response = requests.post(url, data=data)
+            response = self.session.post(url, data=data)
             response.raise_for_status()
-            print(f"Added datapoint to {goal_slug}: value={value}, timestamp={timestamp}")
+            logger.debug("Added datapoint to %s: value=%s, timestamp=%s", goal_slug, value, timestamp)
             return True
         except requests.exceptions.RequestException as e:
-            print(f"Error adding datapoint to {goal_slug}: {e}")
+            logger.error("Error adding datapoint to %s: %s", goal_slug, e)
             return False
 
     def delete_datapoint(self, goal_slug: str, datapoint_id: str) -> bool:
@@ -109,12 +209,12 @@ class BeeminderAPI:
         params = {'auth_token': self.auth_token}
 
         try:
-            response = requests.delete(url, params=params)
+            response = self.session.delete(url, params=params)
             response.raise_for_status()
-            print(f"Deleted datapoint {datapoint_id} from {goal_slug}")
+            logger.debug("Deleted datapoint %s from %s", datapoint_id, goal_slug)
             return True
         except requests.exceptions.RequestException as e:
-            print(f"Error deleting datapoint {datapoint_id} from {goal_slug}: {e}")
+            logger.error("Error deleting datapoint %s from %s: %s", datapoint_id, goal_slug, e)
             return False
 
 class MeditationDatabase:
@@ -123,36 +223,55 @@ class MeditationDatabase:
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self.data = self._load_or_create()
+        # Datapoints keyed by (timestamp, value), for O(1) existence checks and sync diffs
+        self._index = {(dp['timestamp'], dp['value']): dp for dp in self.data['datapoints']}
+        # Content as of the last load/save, used to skip rewriting an unchanged file
+        self._saved_content = self._content()
+
+    def _content(self) -> bytes:
+        """Serialize everything except the last_updated stamp"""
+        return orjson.dumps({k: v for k, v in self.data.items() if k != 'last_updated'})
 
     def _load_or_create(self) -> Dict:
         """Load existing database or create a new one"""
         if self.db_path.exists():
-            print(f"Loading existing database from {self.db_path}")
-            with open(self.db_path, 'r') as f:
-                return json.load(f)
+            logger.info("Loading existing database from %s", self.db_path)
+            return orjson.loads(self.db_path.read_bytes())
         else:
-            print(f"Creating new database at {self.db_path}")
+            logger.info("Creating new database at %s", self.db_path)
             self.db_path.parent.mkdir(parents=True, exist_ok=True)
             initial_data = {
                 'datapoints': [],
                 'last_updated': datetime.now(timezone.utc).isoformat()
             }
             # Save initial data directly
-            with open(self.db_path, 'w') as f:
-                json.dump(initial_data, f, indent=2)
+            self.db_path.write_bytes(orjson.dumps(initial_data, option=orjson.OPT_INDENT_2))
             return initial_data
 
     def save(self):
-        """Save database to file"""
+        """Save database to file if anything changed since it was loaded or last saved"""
+        content = self._content()
+        if content == self._saved_content:
+            logger.info("Database unchanged, not rewriting %s", self.db_path)
+            return
+
         self.data['last_updated'] = datetime.now(timezone.utc).isoformat()
-        with open(self.db_path, 'w') as f:
-            json.dump(self.data, f, indent=2)
-        print(f"Database saved to {self.db_path}")
+        # Write to a temporary file and rename it over the database, so an
+        # interrupted save never leaves a truncated file behind
+        tmp_path = self.db_path.with_name(self.db_path.name + '.tmp')
+        tmp_path.write_bytes(orjson.dumps(self.data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, self.db_path)
+        self._saved_content = content
+        logger.info("Database saved to %s", self.db_path)
 
     def get_datapoints(self) -> List[Dict]:
         """Get all datapoints from database"""
         return self.data.get('datapoints', [])
 
+    def get_datapoints_by_key(self) -> Dict[Tuple[int, float], Dict]:
+        """Get all datapoints keyed by (timestamp, value)"""
+        return self._index
+
     def add_datapoint(self, value: float, timestamp: int, comment: str = ""):
         """Add a datapoint to the database"""
         datapoint = {
@@ -162,14 +281,27 @@ class MeditationDatabase:
             'id': f"local_{timestamp}_{value}"
         }
         self.data['datapoints'].append(datapoint)
-        print(f"Added datapoint to local database: {datapoint}")
+        self._index[(timestamp, value)] = datapoint
+        logger.debug("Added datapoint to local database: %s", datapoint)
 
     def datapoint_exists(self, timestamp: int, value: float) -> bool:
         """Check if a datapoint already exists"""
-        for dp in self.data['datapoints']:
-            if dp['timestamp'] == timestamp and dp['value'] == value:
-                return True
-        return False
+        return (timestamp, value) in self._index
+
+def load_http_cache(cache_path: Path) -> Dict:
+    """Load the HTTP cache of Beeminder datapoint pages, or start an empty one"""
+    try:
+        return orjson.loads(cache_path.read_bytes())
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.debug("Not using HTTP cache %s: %s", cache_path, e)
+        return {}
+
+def save_http_cache(cache_path: Path, http_cache: Dict):
+    """Save the HTTP cache of Beeminder datapoint pages"""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    tmp_path.write_bytes(orjson.dumps(http_cache))
+    os.replace(tmp_path, cache_path)
 
 def extract_actual_time_from_apple_health(datapoint: Dict) -> Optional[datetime]:
     """
@@ -183,22 +315,18 @@ def extract_actual_time_from_apple_health(datapoint: Dict) -> Optional[datetime]
 
     fulltext = datapoint.get('fulltext', '')
 
-    # Pattern to match: "YYYY-Mon-DD entered at HH:MM"
-    pattern = r'(\d{4})-([A-Za-z]{3})-(\d{2}) entered at (\d{2}):(\d{2})'
-    match = re.search(pattern, fulltext)
+    # Cheap substring check rules out most text before running the regex
+    if 'entered at' not in fulltext:
+        return None
+
+    match = _APPLE_HEALTH_RE.search(fulltext)
 
     if not match:
         return None
 
     year, month_str, day, hour, minute = match.groups()
 
-    # Convert month abbreviation to number
-    month_map = {
-        'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-        'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-    }
-
-    month = month_map.get(month_str)
+    month = _MONTH_MAP.get(month_str)
     if not month:
         return None
 
@@ -212,65 +340,103 @@ def extract_actual_time_from_apple_health(datapoint: Dict) -> Optional[datetime]
     except ValueError:
         return None
 
-def sync_beeminder_with_database(api: BeeminderAPI, db: MeditationDatabase, goal_slug: str):
+def sync_beeminder_with_database(api: BeeminderAPI, db: MeditationDatabase, goal_slug: str,
+                                 beeminder_data: Optional[Iterable[Dict]] = None):
     """Sync Beeminder goal with local database"""
-    print(f"\nSyncing {goal_slug} with local database...")
-
-    # Get current data from both sources
-    beeminder_data = api.get_goal_data(goal_slug)
-    local_data = db.get_datapoints()
-
-    # Create lookup sets for comparison (using timestamp and value as unique identifier)
-    beeminder_set = {(dp['timestamp'], dp['value']) for dp in beeminder_data}
-    local_set = {(dp['timestamp'], dp['value']) for dp in local_data}
-
-    # Find differences
-    to_delete_from_beeminder = beeminder_set - local_set
-    to_add_to_beeminder = local_set - beeminder_set
-
-    # Delete datapoints from Beeminder that aren't in local database
-    for timestamp, value in to_delete_from_beeminder:
-        # Find the datapoint ID
-        for dp in beeminder_data:
-            if dp['timestamp'] == timestamp and dp['value'] == value:
-                api.delete_datapoint(goal_slug, dp['id'])
-                break
-
-    # Add datapoints to Beeminder that are in local database
-    for timestamp, value in to_add_to_beeminder:
-        # Find the comment from local data
-        comment = ""
-        for dp in local_data:
-            if dp['timestamp'] == timestamp and dp['value'] == value:
-                comment = dp.get('comment', '')
-                break
-        api.add_datapoint(goal_slug, value, timestamp, comment)
-
-    print(f"Sync complete. Deleted {len(to_delete_from_beeminder)} datapoints, added {len(to_add_to_beeminder)} datapoints.")
-
-def check_and_add_qualifying_meditation(api: BeeminderAPI, db: MeditationDatabase):
+    logger.info("Syncing %s with local database...", goal_slug)
+
+    # Stream the goal's datapoints unless they were already fetched
+    if beeminder_data is None:
+        beeminder_data = api.iter_goal_data(goal_slug)
+    local_by_key = db.get_datapoints_by_key()
+
+    # Index Beeminder data by (timestamp, value), the unique identifier of a datapoint,
+    # in the same single pass that consumes it, the way the database indexes its own
+    # datapoints. The key views double as the sets being compared.
+    bee_by_key = {(dp['timestamp'], dp['value']): dp for dp in beeminder_data}
+
+    if not bee_by_key and not local_by_key:
+        logger.info("Sync complete. Both goal and database are empty.")
+        return
+
+    beeminder_set = bee_by_key.keys()
+    local_set = local_by_key.keys()
+
+    if beeminder_set == local_set:
+        logger.info("Sync complete. Goal already matches database.")
+        return
+
+    # Find differences (an empty side needs no set difference at all)
+    to_delete_from_beeminder = beeminder_set - local_set if local_set else beeminder_set
+    to_add_to_beeminder = local_set - beeminder_set if beeminder_set else local_set
+
+    # Dispatch all mutations concurrently; each one is an independent request
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = []
+
+        # Delete datapoints from Beeminder that aren't in local database
+        for timestamp, value in to_delete_from_beeminder:
+            dp = bee_by_key[(timestamp, value)]
+            futures.append(executor.submit(api.delete_datapoint, goal_slug, dp['id']))
+
+        # Add datapoints to Beeminder that are in local database
+        for timestamp, value in to_add_to_beeminder:
+            comment = local_by_key[(timestamp, value)].get('comment', '')
+            futures.append(executor.submit(api.add_datapoint, goal_slug, value, timestamp, comment))
+
+        failed = sum(1 for future in as_completed(futures) if not future.result())
+
+    logger.info("Sync complete. Deleted %s datapoints, added %s datapoints.", len(to_delete_from_beeminder), len(to_add_to_beeminder))
+    if failed:
+        logger.warning("%s Beeminder request(s) failed during sync", failed)
+
+def check_and_add_qualifying_meditation(api: BeeminderAPI, db: MeditationDatabase,
+                                        meditation_data: Optional[Iterable[Dict]] = None,
+                                        now: Optional[datetime] = None):
     """Check meditatev4 goal for qualifying meditations and add them if found"""
-    print(f"\nChecking {BEEMINDER_SOURCE_GOAL} for qualifying meditations...")
+    logger.info("Checking %s for qualifying meditations...", BEEMINDER_SOURCE_GOAL)
 
-    # Get meditation data from source goal
-    meditation_data = api.get_goal_data(BEEMINDER_SOURCE_GOAL)
-    print(f"Found {len(meditation_data)} total meditation entries")
+    # Entries stamped before midnight LOOKBACK_DAYS ago are skipped with a plain
+    # integer comparison. Apple Health stamps entries at the end of their day,
+    # so the extra day keeps yesterday's entries in range.
+    if now is None:
+        now = datetime.now(NYC_TZ)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff_ts = int((today_start - timedelta(days=LOOKBACK_DAYS)).timestamp())
 
     # Group qualifying meditations by date (one per day)
     qualifying_by_date = {}
 
+    # Stream meditation data from source goal unless it was already fetched
+    if meditation_data is None:
+        meditation_data = api.iter_goal_data(BEEMINDER_SOURCE_GOAL)
+
     for datapoint in meditation_data:
+        # Cheap numeric checks first, so most entries never reach the datetime work
+        if datapoint['timestamp'] < cutoff_ts:
+            continue
+
+        # Check if meditation is at least 35 minutes
+        if datapoint['value'] < 35:
+            logger.debug("Too short (%s < 35 minutes) at timestamp %s", datapoint['value'], datapoint['timestamp'])
+            continue
+
+        # Check if we've already recorded this meditation
+        if db.datapoint_exists(datapoint['timestamp'], 1):
+            logger.debug("Already recorded: %s min at timestamp %s", datapoint['value'], datapoint['timestamp'])
+            continue
+
         # For Apple Health entries, extract the actual entry time from fulltext
         actual_time = extract_actual_time_from_apple_health(datapoint)
 
         if actual_time:
             # Use the parsed time from Apple Health
             meditation_time = actual_time
-            print(f"Apple Health entry: {datapoint['value']} min, actual time: {meditation_time}")
+            logger.debug("Apple Health entry: %s min, actual time: %s", datapoint['value'], meditation_time)
         else:
             # Use the timestamp for non-Apple Health entries
             meditation_time = datetime.fromtimestamp(datapoint['timestamp'], tz=NYC_TZ)
-            print(f"Regular entry: {datapoint['value']} min at {meditation_time}")
+            logger.debug("Regular entry: %s min at %s", datapoint['value'], meditation_time)
 
         meditation_date = meditation_time.date()
 
@@ -280,20 +446,10 @@ def check_and_add_qualifying_meditation(api: BeeminderAPI, db: MeditationDatabas
 
         # Check if meditation was between 5 AM and 8:30 AM
         if not (day_5am <= meditation_time <= day_830am):
-            print(f"  → Not in qualifying time window (5:00-8:30 AM)")
-            continue
-
-        # Check if meditation is at least 35 minutes
-        if datapoint['value'] < 35:
-            print(f"  → Too short ({datapoint['value']} < 35 minutes)")
-            continue
-
-        # Check if we've already recorded this meditation
-        if db.datapoint_exists(datapoint['timestamp'], 1):
-            print(f"  → Already recorded: {meditation_time}")
+            logger.debug("  → Not in qualifying time window (5:00-8:30 AM)")
             continue
 
-        print(f"  → ✓ QUALIFYING: {datapoint['value']} minutes at {meditation_time}")
+        logger.debug("  → ✓ QUALIFYING: %s minutes at %s", datapoint['value'], meditation_time)
 
         # Store the best (longest) qualifying meditation for each date
         if meditation_date not in qualifying_by_date or datapoint['value'] > qualifying_by_date[meditation_date]['datapoint']['value']:
@@ -308,7 +464,7 @@ def check_and_add_qualifying_meditation(api: BeeminderAPI, db: MeditationDatabas
         datapoint = data['datapoint']
         meditation_time = data['actual_time']
 
-        print(f"\nAdding qualifying meditation: {datapoint['value']} minutes at {meditation_time}")
+        logger.info("Adding qualifying meditation: %s minutes at %s", datapoint['value'], meditation_time)
         comment = f"Early meditation: {datapoint['value']} minutes at {meditation_time.strftime('%H:%M')}"
 
         # Add to local database
@@ -318,45 +474,55 @@ def check_and_add_qualifying_meditation(api: BeeminderAPI, db: MeditationDatabas
         success = api.add_datapoint(BEEMINDER_GOAL_SLUG, 1, datapoint['timestamp'], comment)
 
         if success:
-            print(f"✓ Added to database and {BEEMINDER_GOAL_SLUG}")
+            logger.info("✓ Added to database and %s", BEEMINDER_GOAL_SLUG)
             added_count += 1
-            # Save database after adding
-            db.save()
         else:
-            print(f"✗ Failed to add to {BEEMINDER_GOAL_SLUG}")
+            logger.error("✗ Failed to add to %s", BEEMINDER_GOAL_SLUG)
 
     if added_count == 0:
-        print("No new qualifying meditations found")
+        logger.info("No new qualifying meditations found")
     else:
-        print(f"\nAdded {added_count} qualifying meditation(s)")
+        logger.info("Added %s qualifying meditation(s)", added_count)
 
 def main():
     """Main execution function"""
-    print("=" * 50)
-    print("Beeminder Meditation Sync")
-    print(f"Time: {datetime.now(NYC_TZ)}")
-    print("=" * 50)
+    # getLevelName maps a known level name to its number and anything else to a string
+    level = logging.getLevelName(LOG_LEVEL)
+    logging.basicConfig(level=level if isinstance(level, int) else logging.INFO, format='%(message)s')
+    if not isinstance(level, int):
+        logger.warning("Unknown LOGLEVEL %r, using INFO", LOG_LEVEL)
+
+    logger.info("=" * 50)
+    logger.info("Beeminder Meditation Sync")
+    logger.info("Time: %s", datetime.now(NYC_TZ))
+    logger.info("=" * 50)
 
     # Validate environment variables
     if not BEEMINDER_AUTH_TOKEN:
         raise ValueError("BEEMINDER_AUTH_TOKEN not set in environment variables")
 
     # Initialize components
-    api = BeeminderAPI(BEEMINDER_USERNAME, BEEMINDER_AUTH_TOKEN)
     db = MeditationDatabase(DB_PATH)
+    api = BeeminderAPI(BEEMINDER_USERNAME, BEEMINDER_AUTH_TOKEN, load_http_cache(HTTP_CACHE_PATH))
+
+    # Step 1: Fetch both goals concurrently; neither fetch depends on the other
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        goal_future = api.prefetch(BEEMINDER_GOAL_SLUG, executor)
+        source_future = api.prefetch(BEEMINDER_SOURCE_GOAL, executor)
 
-    # Step 2: Sync Beeminder goal with local database
-    sync_beeminder_with_database(api, db, BEEMINDER_GOAL_SLUG)
+        # Step 2: Sync Beeminder goal with local database
+        sync_beeminder_with_database(api, db, BEEMINDER_GOAL_SLUG, beeminder_data=goal_future.result())
 
-    # Step 3: Check for qualifying meditations
-    check_and_add_qualifying_meditation(api, db)
+        # Step 3: Check for qualifying meditations
+        check_and_add_qualifying_meditation(api, db, meditation_data=source_future.result())
 
     # Save final state
     db.save()
+    save_http_cache(HTTP_CACHE_PATH, api.http_cache)
 
-    print("\n" + "=" * 50)
-    print("Sync completed successfully!")
-    print("=" * 50)
+    logger.info("=" * 50)
+    logger.info("Sync completed successfully!")
+    logger.info("=" * 50)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
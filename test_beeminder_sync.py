@@ -3,14 +3,16 @@
 Comprehensive tests for beeminder_sync.py with 100% test coverage
 """
 
-import unittest
-from unittest.mock import Mock, patch, mock_open, MagicMock
+import io
+import pytest
+from unittest.mock import DEFAULT, Mock, patch
 import json
+import logging
 import os
-import tempfile
-from pathlib import Path
-from datetime import datetime, timezone
-import pytz
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import requests
+from requests.exceptions import RequestException
 
 # Import the module under test
 import sys
@@ -22,571 +24,792 @@ from beeminder_sync import (
     sync_beeminder_with_database,
     check_and_add_qualifying_meditation,
     load_env,
+    load_http_cache,
+    save_http_cache,
     main,
     NYC_TZ
 )
 
 
-class TestLoadEnv(unittest.TestCase):
-    """Test environment variable loading"""
-
-    @patch('builtins.open', mock_open(read_data='TEST_VAR=test_value\nANOTHER_VAR=another_value\n# Comment line\n\n'))
-    @patch('os.path.exists', return_value=True)
-    def test_load_env_success(self, mock_exists):
-        """Test successful loading of environment variables"""
-        with patch.dict('os.environ', {}, clear=True):
-            load_env()
-            self.assertEqual(os.environ.get('TEST_VAR'), 'test_value')
-            self.assertEqual(os.environ.get('ANOTHER_VAR'), 'another_value')
-
-    @patch('os.path.exists', return_value=False)
-    def test_load_env_file_not_exists(self, mock_exists):
-        """Test load_env when .env file doesn't exist"""
-        with patch.dict('os.environ', {}, clear=True):
-            load_env()  # Should not raise an exception
-
-    @patch('builtins.open', mock_open(read_data='INVALID_LINE_NO_EQUALS\nVALID=value\n'))
-    @patch('os.path.exists', return_value=True)
-    def test_load_env_invalid_lines(self, mock_exists):
-        """Test load_env with invalid lines"""
-        with patch.dict('os.environ', {}, clear=True):
-            load_env()
-            self.assertEqual(os.environ.get('VALID'), 'value')
-            self.assertIsNone(os.environ.get('INVALID_LINE_NO_EQUALS'))
-
-
-class TestBeeminderAPI(unittest.TestCase):
-    """Test BeeminderAPI class"""
-
-    def setUp(self):
-        self.api = BeeminderAPI('testuser', 'testtoken')
-
-    def test_init(self):
-        """Test BeeminderAPI initialization"""
-        self.assertEqual(self.api.username, 'testuser')
-        self.assertEqual(self.api.auth_token, 'testtoken')
-        self.assertEqual(self.api.base_url, 'https://www.beeminder.com/api/v1')
-
-    @patch('requests.get')
-    def test_get_goal_data_single_page(self, mock_get):
-        """Test get_goal_data with single page of results"""
-        mock_response = Mock()
-        mock_response.json.return_value = [
-            {'id': '1', 'timestamp': 1234567890, 'value': 30},
-            {'id': '2', 'timestamp': 1234567891, 'value': 45}
-        ]
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+def _apple_health(value, entered_at, timestamp=1758945599, id='test1'):
+    """Apple Health datapoint for 2025-09-26 (stamped at the end of that day)"""
+    return {
+        'timestamp': timestamp,
+        'value': value,
+        'comment': 'Auto-entered via Apple Health',
+        'fulltext': f'2025-Sep-26 entered at {entered_at} by zarathustra via BeemiOS',
+        'id': id
+    }
 
-        result = self.api.get_goal_data('test-goal')
 
-        self.assertEqual(len(result), 2)
-        self.assertEqual(result[0]['id'], '1')
-        mock_get.assert_called_once()
+# Source goal payloads shared by the tests; tuples so no test can mutate them
+_APPLE_HEALTH_QUALIFYING = (_apple_health(45.0, '07:21'),)
+_APPLE_HEALTH_AFTERNOON = (_apple_health(45.0, '14:00'),)
+_APPLE_HEALTH_TOO_SHORT = (_apple_health(20.0, '07:21'),)
+_APPLE_HEALTH_SAME_DAY = (_apple_health(35.0, '07:21'), _apple_health(50.0, '08:00', 1758946000, 'test2'))
 
-    @patch('requests.get')
-    def test_get_goal_data_multiple_pages(self, mock_get):
-        """Test get_goal_data with multiple pages of results"""
-        # First page (full page)
-        first_response = Mock()
-        first_response.json.return_value = [{'id': str(i), 'timestamp': 1234567890 + i, 'value': 30} for i in range(300)]
-        first_response.raise_for_status.return_value = None
 
-        # Second page (partial page)
-        second_response = Mock()
-        second_response.json.return_value = [{'id': '300', 'timestamp': 1234568190, 'value': 30}]
-        second_response.raise_for_status.return_value = None
-
-        mock_get.side_effect = [first_response, second_response]
-
-        result = self.api.get_goal_data('test-goal')
-
-        self.assertEqual(len(result), 301)
-        self.assertEqual(mock_get.call_count, 2)
+class _ApiStub:
+    """Lightweight BeeminderAPI stand-in that records its calls"""
 
-    @patch('requests.get')
-    def test_get_goal_data_empty_response(self, mock_get):
-        """Test get_goal_data with empty response"""
-        mock_response = Mock()
-        mock_response.json.return_value = []
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+    def __init__(self):
+        self.calls = []
+        self.goal_data = []
+        self.add_ok = True
+        self.delete_ok = True
 
-        result = self.api.get_goal_data('test-goal')
+    def iter_goal_data(self, goal_slug):
+        self.calls.append(('iter_goal_data', (goal_slug,)))
+        return iter(self.goal_data)
 
-        self.assertEqual(len(result), 0)
+    def get_goal_data(self, goal_slug):
+        self.calls.append(('get_goal_data', (goal_slug,)))
+        return list(self.goal_data)
 
-    @patch('requests.get')
-    def test_get_goal_data_request_exception(self, mock_get):
-        """Test get_goal_data with request exception"""
-        import requests
-        mock_get.side_effect = requests.exceptions.RequestException('Network error')
-
-        result = self.api.get_goal_data('test-goal')
+    def add_datapoint(self, goal_slug, value, timestamp, comment=""):
+        self.calls.append(('add_datapoint', (goal_slug, value, timestamp, comment)))
+        return self.add_ok
 
-        self.assertEqual(len(result), 0)
+    def delete_datapoint(self, goal_slug, datapoint_id):
+        self.calls.append(('delete_datapoint', (goal_slug, datapoint_id)))
+        return self.delete_ok
 
-    @patch('requests.post')
-    def test_add_datapoint_success(self, mock_post):
-        """Test successful add_datapoint"""
-        mock_response = Mock()
-        mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
-
-        result = self.api.add_datapoint('test-goal', 1.0, 1234567890, 'test comment')
-
-        self.assertTrue(result)
-        mock_post.assert_called_once()
+    def calls_to(self, name):
+        """Arguments of every call to one method, sorted (sync calls from threads)"""
+        return sorted(args for called, args in self.calls if called == name)
 
-    @patch('requests.post')
-    def test_add_datapoint_failure(self, mock_post):
-        """Test failed add_datapoint"""
-        import requests
-        mock_post.side_effect = requests.exceptions.RequestException('API error')
 
-        result = self.api.add_datapoint('test-goal', 1.0, 1234567890, 'test comment')
+@pytest.fixture(scope="session")
+def _empty_db_template(tmp_path_factory):
+    """On-disk bytes of a newly created database, built once per session"""
+    db = MeditationDatabase(tmp_path_factory.mktemp('template') / 'db.json')
+    return db.db_path.read_bytes()
 
-        self.assertFalse(result)
 
-    @patch('requests.delete')
-    def test_delete_datapoint_success(self, mock_delete):
-        """Test successful delete_datapoint"""
-        mock_response = Mock()
-        mock_response.raise_for_status.return_value = None
-        mock_delete.return_value = mock_response
+@pytest.fixture
+def db(tmp_path, _empty_db_template):
+    """Fresh empty database under tmp_path, copied from the session template"""
+    db_path = tmp_path / 'db.json'
+    db_path.write_bytes(_empty_db_template)
+    return MeditationDatabase(db_path)
 
-        result = self.api.delete_datapoint('test-goal', 'datapoint-id')
 
-        self.assertTrue(result)
-        mock_delete.assert_called_once()
+# load_env
 
-    @patch('requests.delete')
-    def test_delete_datapoint_failure(self, mock_delete):
-        """Test failed delete_datapoint"""
-        import requests
-        mock_delete.side_effect = requests.exceptions.RequestException('API error')
+def test_load_env_success(monkeypatch):
+    """Test successful loading of environment variables"""
+    monkeypatch.setattr(os.path, 'exists', lambda path: True)
+    env_file = io.StringIO('TEST_VAR=test_value\nANOTHER_VAR=another_value\n# Comment line\n\n')
+    with patch('builtins.open', return_value=env_file), patch.dict('os.environ', {}, clear=True):
+        load_env()
+        assert os.environ.get('TEST_VAR') == 'test_value'
+        assert os.environ.get('ANOTHER_VAR') == 'another_value'
 
-        result = self.api.delete_datapoint('test-goal', 'datapoint-id')
 
-        self.assertFalse(result)
+def test_load_env_file_not_exists(monkeypatch):
+    """Test load_env when .env file doesn't exist"""
+    monkeypatch.setattr(os.path, 'exists', lambda path: False)
+    with patch.dict('os.environ', {}, clear=True):
+        load_env()  # Should not raise an exception
 
 
-class TestMeditationDatabase(unittest.TestCase):
-    """Test MeditationDatabase class"""
+def test_load_env_invalid_lines(monkeypatch):
+    """Test load_env with invalid lines"""
+    monkeypatch.setattr(os.path, 'exists', lambda path: True)
+    env_file = io.StringIO('INVALID_LINE_NO_EQUALS\nVALID=value\n')
+    with patch('builtins.open', return_value=env_file), patch.dict('os.environ', {}, clear=True):
+        load_env()
+        assert os.environ.get('VALID') == 'value'
+        assert os.environ.get('INVALID_LINE_NO_EQUALS') is None
 
-    def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
-        self.db_path = Path(self.temp_dir) / 'test_db.json'
 
-    def tearDown(self):
-        if self.db_path.exists():
-            self.db_path.unlink()
-        os.rmdir(self.temp_dir)
+def test_load_env_whitespace_and_equals(monkeypatch):
+    """Test load_env strips surrounding whitespace and splits on the first '='"""
+    monkeypatch.setattr(os.path, 'exists', lambda path: True)
+    env_file = io.StringIO('  INDENTED=value  \nWITH_EQUALS=a=b\nEMPTY=\n')
+    with patch('builtins.open', return_value=env_file), patch.dict('os.environ', {}, clear=True):
+        load_env()
+        assert os.environ.get('INDENTED') == 'value'
+        assert os.environ.get('WITH_EQUALS') == 'a=b'
+        assert os.environ.get('EMPTY') == ''
 
-    def test_init_new_database(self):
-        """Test initialization of new database"""
-        db = MeditationDatabase(self.db_path)
 
-        self.assertTrue(self.db_path.exists())
-        self.assertEqual(len(db.get_datapoints()), 0)
-        self.assertIn('last_updated', db.data)
+# BeeminderAPI
 
-    def test_init_existing_database(self):
-        """Test initialization of existing database"""
-        # Create existing database
-        initial_data = {
-            'datapoints': [{'value': 1, 'timestamp': 123, 'comment': 'test', 'id': 'test_id'}],
-            'last_updated': '2023-01-01T00:00:00Z'
-        }
-        with open(self.db_path, 'w') as f:
-            json.dump(initial_data, f)
+# A full page of datapoints (Beeminder's per_page maximum), built once
+_PAGE1 = tuple({'id': str(i), 'timestamp': 1234567890 + i, 'value': 30} for i in range(300))
 
-        db = MeditationDatabase(self.db_path)
 
-        self.assertEqual(len(db.get_datapoints()), 1)
-        self.assertEqual(db.get_datapoints()[0]['value'], 1)
+@pytest.fixture
+def fake_request(monkeypatch):
+    """Stand-in for Session.request, called with (method, url, **kwargs)"""
+    # Every session.get/post/delete goes through Session.request, so one
+    # stand-in intercepts them all
+    request = Mock()
+    monkeypatch.setattr(requests.Session, 'request', request)
+    return request
 
-    def test_add_datapoint(self):
-        """Test adding a datapoint"""
-        db = MeditationDatabase(self.db_path)
 
-        db.add_datapoint(1.0, 1234567890, 'Test meditation')
+@pytest.fixture
+def api(fake_request):
+    """BeeminderAPI whose HTTP requests hit fake_request"""
+    return BeeminderAPI('testuser', 'testtoken')
 
-        datapoints = db.get_datapoints()
-        self.assertEqual(len(datapoints), 1)
-        self.assertEqual(datapoints[0]['value'], 1.0)
-        self.assertEqual(datapoints[0]['timestamp'], 1234567890)
-        self.assertEqual(datapoints[0]['comment'], 'Test meditation')
 
-    def test_datapoint_exists_true(self):
-        """Test datapoint_exists when datapoint exists"""
-        db = MeditationDatabase(self.db_path)
-        db.add_datapoint(1.0, 1234567890, 'Test')
+def test_api_init(api):
+    """Test BeeminderAPI initialization"""
+    assert api.username == 'testuser'
+    assert api.auth_token == 'testtoken'
+    assert api.base_url == 'https://www.beeminder.com/api/v1'
+    assert isinstance(api.session, requests.Session)
+    retries = api.session.get_adapter(api.base_url).max_retries
+    assert retries.total == 5
+    assert 'POST' not in retries.allowed_methods
 
-        self.assertTrue(db.datapoint_exists(1234567890, 1.0))
 
-    def test_datapoint_exists_false(self):
-        """Test datapoint_exists when datapoint doesn't exist"""
-        db = MeditationDatabase(self.db_path)
+def test_get_goal_data_single_page(fake_request, api):
+    """Test get_goal_data with single page of results"""
+    mock_response = Mock()
+    mock_response.json.return_value = [
+        {'id': '1', 'timestamp': 1234567890, 'value': 30},
+        {'id': '2', 'timestamp': 1234567891, 'value': 45}
+    ]
+    mock_response.raise_for_status.return_value = None
+    fake_request.return_value = mock_response
 
-        self.assertFalse(db.datapoint_exists(1234567890, 1.0))
+    result = api.get_goal_data('test-goal')
 
-    def test_save(self):
-        """Test saving database"""
-        db = MeditationDatabase(self.db_path)
-        db.add_datapoint(1.0, 1234567890, 'Test')
+    assert len(result) == 2
+    assert result[0]['id'] == '1'
+    fake_request.assert_called_once()
 
-        db.save()
 
+def test_get_goal_data_multiple_pages(fake_request, api):
+    """Test get_goal_data with multiple pages of results"""
+    # First page (full page)
+    first_response = Mock()
+    first_response.json.return_value = list(_PAGE1)
+    first_response.raise_for_status.return_value = None
+
+    # Second page (partial page)
+    second_response = Mock()
+    second_response.json.return_value = [{'id': '300', 'timestamp': 1234568190, 'value': 30}]
+    second_response.raise_for_status.return_value = None
+
+    # Pages past the end come back empty
+    empty_response = Mock()
+    empty_response.json.return_value = []
+    empty_response.raise_for_status.return_value = None
+
+    responses = {1: first_response, 2: second_response}
+    fake_request.side_effect = lambda method, url, params, **kwargs: responses.get(params['page'], empty_response)
+
+    result = api.get_goal_data('test-goal')
+
+    assert len(result) == 301
+    assert result[-1]['id'] == '300'
+    requested_pages = sorted(call.kwargs['params']['page'] for call in fake_request.call_args_list)
+    assert requested_pages[:2] == [1, 2]
+
+
+def test_get_goal_data_concurrent_pages_in_order(monkeypatch, fake_request, api):
+    """Test pages fetched concurrently are yielded in page order"""
+    monkeypatch.setattr('beeminder_sync.PAGE_WORKERS', 2)
+    def page_response(method, url, params, **kwargs):
+        page = params['page']
+        response = Mock()
+        size = 300 if page < 4 else 10
+        response.json.return_value = [{'id': f'{page}-{i}', 'timestamp': i, 'value': 30} for i in range(size)]
+        return response
+
+    fake_request.side_effect = page_response
+
+    result = api.get_goal_data('test-goal')
+
+    assert len(result) == 910
+    assert [dp['id'] for dp in result[::300]] == ['1-0', '2-0', '3-0', '4-0']
+
+
+def test_get_goal_data_error_on_later_page(fake_request, api):
+    """Test get_goal_data keeps earlier pages when a later page fails"""
+    first_response = Mock()
+    first_response.json.return_value = list(_PAGE1)
+
+    def page_response(method, url, params, **kwargs):
+        if params['page'] == 1:
+            return first_response
+        raise RequestException('Network error')
+
+    fake_request.side_effect = page_response
+
+    result = api.get_goal_data('test-goal')
+
+    assert len(result) == 300
+
+
+def test_get_goal_data_not_modified(fake_request):
+    """Test get_goal_data reuses the cached page on 304 Not Modified"""
+    cached_body = [{'id': '1', 'timestamp': 1234567890, 'value': 30}]
+    api = BeeminderAPI('testuser', 'testtoken', {
+        'test-goal': {'1': {'etag': '"abc"', 'last_modified': None, 'body': cached_body}}
+    })
+    mock_response = Mock()
+    mock_response.status_code = 304
+    fake_request.return_value = mock_response
+
+    result = api.get_goal_data('test-goal')
+
+    assert result == cached_body
+    assert fake_request.call_args.kwargs['headers'] == {'If-None-Match': '"abc"'}
+    mock_response.json.assert_not_called()
+
+
+def test_get_goal_data_caches_validators(fake_request, api):
+    """Test get_goal_data stores ETag and body of fetched pages"""
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.headers = {'ETag': '"abc"', 'Last-Modified': 'Fri, 26 Sep 2025 12:00:00 GMT'}
+    mock_response.json.return_value = [{'id': '1', 'timestamp': 1234567890, 'value': 30}]
+    fake_request.return_value = mock_response
+
+    api.get_goal_data('test-goal')
+
+    cached = api.http_cache['test-goal']['1']
+    assert cached['etag'] == '"abc"'
+    assert cached['last_modified'] == 'Fri, 26 Sep 2025 12:00:00 GMT'
+    assert cached['body'] == mock_response.json.return_value
+
+
+def test_get_goal_data_does_not_cache_pages_past_the_end(fake_request, api):
+    """Test empty pages requested past the end are left out of the cache"""
+    def page_response(method, url, params, **kwargs):
+        page = params['page']
+        response = Mock()
+        response.status_code = 200
+        response.headers = {'ETag': f'"{page}"'}
+        response.json.return_value = {1: list(_PAGE1), 2: list(_PAGE1[:10])}.get(page, [])
+        return response
+
+    fake_request.side_effect = page_response
+
+    api.get_goal_data('test-goal')
+
+    assert sorted(api.http_cache['test-goal']) == ['1', '2']
+
+
+def test_iter_goal_data_is_lazy(fake_request, api):
+    """Test iter_goal_data does not fetch until it is consumed"""
+    mock_response = Mock()
+    mock_response.json.return_value = [{'id': '1', 'timestamp': 1234567890, 'value': 30}]
+    fake_request.return_value = mock_response
+
+    datapoints = api.iter_goal_data('test-goal')
+    fake_request.assert_not_called()
+
+    assert next(datapoints)['id'] == '1'
+    fake_request.assert_called_once()
+
+
+def test_get_goal_data_empty_response(fake_request, api):
+    """Test get_goal_data with empty response"""
+    mock_response = Mock()
+    mock_response.json.return_value = []
+    mock_response.raise_for_status.return_value = None
+    fake_request.return_value = mock_response
+
+    result = api.get_goal_data('test-goal')
+
+    assert len(result) == 0
+
+
+def test_get_goal_data_request_exception(fake_request, api):
+    """Test get_goal_data with request exception"""
+    fake_request.side_effect = RequestException('Network error')
+
+    result = api.get_goal_data('test-goal')
+
+    assert len(result) == 0
+
+
+def test_prefetch(fake_request, api):
+    """Test prefetch returns a future resolving to the goal's datapoints"""
+    mock_response = Mock()
+    mock_response.json.return_value = [{'id': '1', 'timestamp': 1234567890, 'value': 30}]
+    fake_request.return_value = mock_response
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = api.prefetch('test-goal', executor)
+
+        assert future.result() == mock_response.json.return_value
+
+
+def test_add_datapoint_success(fake_request, api):
+    """Test successful add_datapoint"""
+    mock_response = Mock()
+    mock_response.raise_for_status.return_value = None
+    fake_request.return_value = mock_response
+
+    result = api.add_datapoint('test-goal', 1.0, 1234567890, 'test comment')
+
+    assert result
+    fake_request.assert_called_once()
+    assert fake_request.call_args.args[0] == 'POST'
+
+
+def test_add_datapoint_failure(fake_request, api):
+    """Test failed add_datapoint"""
+    fake_request.side_effect = RequestException('API error')
+
+    result = api.add_datapoint('test-goal', 1.0, 1234567890, 'test comment')
+
+    assert not result
+
+
+def test_delete_datapoint_success(fake_request, api):
+    """Test successful delete_datapoint"""
+    mock_response = Mock()
+    mock_response.raise_for_status.return_value = None
+    fake_request.return_value = mock_response
+
+    result = api.delete_datapoint('test-goal', 'datapoint-id')
+
+    assert result
+    fake_request.assert_called_once()
+    assert fake_request.call_args.args[0] == 'DELETE'
+
+
+def test_delete_datapoint_failure(fake_request, api):
+    """Test failed delete_datapoint"""
+    fake_request.side_effect = RequestException('API error')
+
+    result = api.delete_datapoint('test-goal', 'datapoint-id')
+
+    assert not result
+
+
+# MeditationDatabase
+
+_EXISTING_DATA = {
+    'datapoints': [{'value': 1, 'timestamp': 123, 'comment': 'test', 'id': 'test_id'}],
+    'last_updated': '2023-01-01T00:00:00Z'
+}
+
+
+def test_init_new_database(tmp_path):
+    """Test initialization of new database"""
+    db_path = tmp_path / 'test_db.json'
+
+    db = MeditationDatabase(db_path)
+
+    assert db_path.exists()
+    assert len(db.get_datapoints()) == 0
+    assert 'last_updated' in db.data
+
+
+def test_init_existing_database(tmp_path):
+    """Test initialization of existing database"""
+    db_path = tmp_path / 'test_db.json'
+    db_path.write_text(json.dumps(_EXISTING_DATA))
+
+    db = MeditationDatabase(db_path)
+
+    assert len(db.get_datapoints()) == 1
+    assert db.get_datapoints()[0]['value'] == 1
+    # The existence index is built from the loaded datapoints
+    assert db.datapoint_exists(123, 1)
+    assert not db.datapoint_exists(123, 0)
+
+
+@pytest.mark.parametrize("op, args, expected", [
+    pytest.param("add", (1.0, 1234567890, 'Test meditation'), [(1.0, 1234567890, 'Test meditation')],
+                 id="add_datapoint"),
+    pytest.param("exists_true", (1234567890, 1.0), True, id="datapoint_exists_true"),
+    pytest.param("exists_false", (1234567890, 1.0), False, id="datapoint_exists_false"),
+    pytest.param("save", (1.0, 1234567890, 'Test'), 1, id="save_roundtrip"),
+])
+def test_db_ops(db, op, args, expected):
+    """Test add/exists/save round trips on a fresh database"""
+    if op == 'add':
+        db.add_datapoint(*args)
+        result = [(dp['value'], dp['timestamp'], dp['comment']) for dp in db.get_datapoints()]
+    elif op == 'exists_true':
+        timestamp, value = args
+        db.add_datapoint(value, timestamp, 'Test')
+        result = db.datapoint_exists(*args)
+    elif op == 'exists_false':
+        result = db.datapoint_exists(*args)
+    else:
+        db.add_datapoint(*args)
+        db.save()
         # Reload and verify
-        with open(self.db_path, 'r') as f:
-            saved_data = json.load(f)
+        saved_data = json.loads(db.db_path.read_bytes())
+        assert 'last_updated' in saved_data
+        result = len(saved_data['datapoints'])
+
+    assert result == expected
+
+
+def test_save_unchanged_skips_write(db):
+    """Test saving an unchanged database leaves the file untouched"""
+    before = db.db_path.read_bytes()
+
+    db.save()
+
+    assert db.db_path.read_bytes() == before
+
+
+def test_save_after_change_is_atomic(db):
+    """Test saving a changed database replaces the file and leaves no temp file"""
+    db.add_datapoint(1.0, 1234567890, 'Test')
+
+    db.save()
+    db.save()  # Second save has nothing new to write
+
+    assert len(json.loads(db.db_path.read_bytes())['datapoints']) == 1
+    assert list(db.db_path.parent.iterdir()) == [db.db_path]
+
+
+def test_get_datapoints_by_key(db):
+    """Test datapoints are indexed by (timestamp, value)"""
+    db.add_datapoint(1.0, 1234567890, 'Test')
+
+    by_key = db.get_datapoints_by_key()
+
+    assert list(by_key) == [(1234567890, 1.0)]
+    assert by_key[(1234567890, 1.0)]['comment'] == 'Test'
+
+
+# HTTP cache persistence
+
+def test_http_cache_roundtrip(tmp_path):
+    """Test the HTTP cache is saved to and loaded from its own file"""
+    cache_path = tmp_path / 'data' / 'http_cache.json'
+    http_cache = {'test-goal': {'1': {'etag': '"abc"', 'last_modified': None, 'body': []}}}
+
+    save_http_cache(cache_path, http_cache)
+
+    assert load_http_cache(cache_path) == http_cache
+    assert list(cache_path.parent.iterdir()) == [cache_path]
+
+
+@pytest.mark.parametrize("content", [
+    pytest.param(None, id="missing"),
+    pytest.param(b'{not json', id="corrupt"),
+])
+def test_load_http_cache_starts_empty(tmp_path, content):
+    """Test a missing or unreadable HTTP cache file gives an empty cache"""
+    cache_path = tmp_path / 'http_cache.json'
+    if content is not None:
+        cache_path.write_bytes(content)
+
+    assert load_http_cache(cache_path) == {}
+
+
+# extract_actual_time_from_apple_health
+
+def test_extract_apple_health_time_success():
+    """Test successful extraction of Apple Health time"""
+    result = extract_actual_time_from_apple_health(_APPLE_HEALTH_QUALIFYING[0])
+
+    assert result is not None
+    assert result.hour == 7
+    assert result.minute == 21
+    assert result.year == 2025
+    assert result.month == 9
+    assert result.day == 26
+    # Late September is daylight saving time in New York
+    assert result.utcoffset() == timedelta(hours=-4)
+
+
+def test_extract_apple_health_time_not_apple_health():
+    """Test extraction from non-Apple Health datapoint"""
+    datapoint = {
+        'comment': 'Manual entry',
+        'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS'
+    }
+
+    result = extract_actual_time_from_apple_health(datapoint)
+
+    assert result is None
 
-        self.assertEqual(len(saved_data['datapoints']), 1)
-        self.assertIn('last_updated', saved_data)
 
+def test_extract_apple_health_time_no_fulltext():
+    """Test extraction with missing fulltext"""
+    datapoint = {
+        'comment': 'Auto-entered via Apple Health'
+    }
 
-class TestExtractActualTimeFromAppleHealth(unittest.TestCase):
-    """Test extract_actual_time_from_apple_health function"""
+    result = extract_actual_time_from_apple_health(datapoint)
 
-    def test_extract_apple_health_time_success(self):
-        """Test successful extraction of Apple Health time"""
-        datapoint = {
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS'
-        }
+    assert result is None
 
-        result = extract_actual_time_from_apple_health(datapoint)
 
-        self.assertIsNotNone(result)
-        self.assertEqual(result.hour, 7)
-        self.assertEqual(result.minute, 21)
-        self.assertEqual(result.year, 2025)
-        self.assertEqual(result.month, 9)
-        self.assertEqual(result.day, 26)
+def test_extract_apple_health_time_invalid_pattern():
+    """Test extraction with invalid fulltext pattern"""
+    datapoint = {
+        'comment': 'Auto-entered via Apple Health',
+        'fulltext': 'Invalid format text'
+    }
 
-    def test_extract_apple_health_time_not_apple_health(self):
-        """Test extraction from non-Apple Health datapoint"""
-        datapoint = {
-            'comment': 'Manual entry',
-            'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS'
-        }
+    result = extract_actual_time_from_apple_health(datapoint)
 
-        result = extract_actual_time_from_apple_health(datapoint)
+    assert result is None
 
-        self.assertIsNone(result)
 
-    def test_extract_apple_health_time_no_fulltext(self):
-        """Test extraction with missing fulltext"""
-        datapoint = {
-            'comment': 'Auto-entered via Apple Health'
-        }
+def test_extract_apple_health_time_malformed_entry_time():
+    """Test extraction when fulltext has an unparseable entry time"""
+    datapoint = {
+        'comment': 'Auto-entered via Apple Health',
+        'fulltext': '2025-Sep-26 entered at 7:21 by zarathustra via BeemiOS'
+    }
 
-        result = extract_actual_time_from_apple_health(datapoint)
+    result = extract_actual_time_from_apple_health(datapoint)
 
-        self.assertIsNone(result)
+    assert result is None
 
-    def test_extract_apple_health_time_invalid_pattern(self):
-        """Test extraction with invalid fulltext pattern"""
-        datapoint = {
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': 'Invalid format text'
-        }
 
-        result = extract_actual_time_from_apple_health(datapoint)
+def test_extract_apple_health_time_invalid_month():
+    """Test extraction with invalid month abbreviation"""
+    datapoint = {
+        'comment': 'Auto-entered via Apple Health',
+        'fulltext': '2025-Inv-26 entered at 07:21 by zarathustra via BeemiOS'
+    }
 
-        self.assertIsNone(result)
+    result = extract_actual_time_from_apple_health(datapoint)
 
-    def test_extract_apple_health_time_invalid_month(self):
-        """Test extraction with invalid month abbreviation"""
-        datapoint = {
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Inv-26 entered at 07:21 by zarathustra via BeemiOS'
-        }
+    assert result is None
 
-        result = extract_actual_time_from_apple_health(datapoint)
 
-        self.assertIsNone(result)
+def test_extract_apple_health_time_invalid_date():
+    """Test extraction with invalid date values"""
+    datapoint = {
+        'comment': 'Auto-entered via Apple Health',
+        'fulltext': '2025-Feb-30 entered at 25:61 by zarathustra via BeemiOS'
+    }
 
-    def test_extract_apple_health_time_invalid_date(self):
-        """Test extraction with invalid date values"""
-        datapoint = {
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Feb-30 entered at 25:61 by zarathustra via BeemiOS'
-        }
-
-        result = extract_actual_time_from_apple_health(datapoint)
-
-        self.assertIsNone(result)
-
-
-class TestSyncBeeminderWithDatabase(unittest.TestCase):
-    """Test sync_beeminder_with_database function"""
-
-    def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
-        self.db_path = Path(self.temp_dir) / 'test_db.json'
-        self.db = MeditationDatabase(self.db_path)
-        self.api = Mock(spec=BeeminderAPI)
-
-    def tearDown(self):
-        if self.db_path.exists():
-            self.db_path.unlink()
-        os.rmdir(self.temp_dir)
-
-    def test_sync_no_differences(self):
-        """Test sync when local and remote are identical"""
-        # Same data in both
-        datapoints = [{'timestamp': 123, 'value': 1.0, 'id': 'test1'}]
-        self.api.get_goal_data.return_value = datapoints
-        self.db.add_datapoint(1.0, 123, 'test')
-
-        sync_beeminder_with_database(self.api, self.db, 'test-goal')
-
-        self.api.delete_datapoint.assert_not_called()
-        self.api.add_datapoint.assert_not_called()
-
-    def test_sync_delete_from_beeminder(self):
-        """Test sync when Beeminder has extra datapoints"""
-        # Beeminder has extra datapoint
-        beeminder_data = [
-            {'timestamp': 123, 'value': 1.0, 'id': 'test1'},
-            {'timestamp': 456, 'value': 2.0, 'id': 'test2'}
-        ]
-        self.api.get_goal_data.return_value = beeminder_data
-        self.db.add_datapoint(1.0, 123, 'test')
-
-        sync_beeminder_with_database(self.api, self.db, 'test-goal')
-
-        self.api.delete_datapoint.assert_called_once_with('test-goal', 'test2')
-
-    def test_sync_add_to_beeminder(self):
-        """Test sync when local database has extra datapoints"""
-        # Local has extra datapoint
-        beeminder_data = [{'timestamp': 123, 'value': 1.0, 'id': 'test1'}]
-        self.api.get_goal_data.return_value = beeminder_data
-        self.db.add_datapoint(1.0, 123, 'test1')
-        self.db.add_datapoint(2.0, 456, 'test2')
-
-        sync_beeminder_with_database(self.api, self.db, 'test-goal')
-
-        self.api.add_datapoint.assert_called_once_with('test-goal', 2.0, 456, 'test2')
-
-
-class TestCheckAndAddQualifyingMeditation(unittest.TestCase):
-    """Test check_and_add_qualifying_meditation function"""
-
-    def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
-        self.db_path = Path(self.temp_dir) / 'test_db.json'
-        self.db = MeditationDatabase(self.db_path)
-        self.api = Mock(spec=BeeminderAPI)
-
-    def tearDown(self):
-        if self.db_path.exists():
-            self.db_path.unlink()
-        os.rmdir(self.temp_dir)
-
-    @patch('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
-    def test_qualifying_apple_health_meditation(self):
-        """Test adding qualifying Apple Health meditation"""
-        # Apple Health meditation at 7:21 AM
-        meditation_data = [{
-            'timestamp': 1758945599,  # End of day timestamp
-            'value': 45.0,
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS',
-            'id': 'test1'
-        }]
-
-        self.api.get_goal_data.return_value = meditation_data
-        self.api.add_datapoint.return_value = True
-
-        check_and_add_qualifying_meditation(self.api, self.db)
-
-        # Should add to both database and Beeminder
-        self.assertEqual(len(self.db.get_datapoints()), 1)
-        self.api.add_datapoint.assert_called_once()
-
-    @patch('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
-    def test_non_qualifying_time(self):
-        """Test non-qualifying meditation (wrong time)"""
-        # Meditation at 2:00 PM (not early morning)
-        meditation_data = [{
-            'timestamp': 1758945599,
-            'value': 45.0,
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Sep-26 entered at 14:00 by zarathustra via BeemiOS',
-            'id': 'test1'
-        }]
-
-        self.api.get_goal_data.return_value = meditation_data
-
-        check_and_add_qualifying_meditation(self.api, self.db)
-
-        # Should not add anything
-        self.assertEqual(len(self.db.get_datapoints()), 0)
-        self.api.add_datapoint.assert_not_called()
-
-    @patch('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
-    def test_non_qualifying_duration(self):
-        """Test non-qualifying meditation (too short)"""
-        # Short meditation at good time
-        meditation_data = [{
-            'timestamp': 1758945599,
-            'value': 20.0,  # Less than 35 minutes
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS',
-            'id': 'test1'
-        }]
-
-        self.api.get_goal_data.return_value = meditation_data
-
-        check_and_add_qualifying_meditation(self.api, self.db)
-
-        # Should not add anything
-        self.assertEqual(len(self.db.get_datapoints()), 0)
-        self.api.add_datapoint.assert_not_called()
-
-    @patch('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
-    def test_already_recorded_meditation(self):
-        """Test meditation already recorded"""
-        meditation_data = [{
-            'timestamp': 1758945599,
-            'value': 45.0,
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS',
-            'id': 'test1'
-        }]
-
-        # Pre-add the meditation to database
-        self.db.add_datapoint(1, 1758945599, 'Already there')
-
-        self.api.get_goal_data.return_value = meditation_data
-
-        check_and_add_qualifying_meditation(self.api, self.db)
-
-        # Should not add duplicate
-        self.assertEqual(len(self.db.get_datapoints()), 1)
-        self.api.add_datapoint.assert_not_called()
-
-    @patch('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
-    def test_regular_entry_qualifying(self):
-        """Test regular (non-Apple Health) qualifying meditation"""
-        # Create a timestamp for 7:00 AM today
-        nyc_now = datetime.now(NYC_TZ)
-        morning_time = nyc_now.replace(hour=7, minute=0, second=0, microsecond=0)
-        morning_timestamp = int(morning_time.timestamp())
-
-        meditation_data = [{
-            'timestamp': morning_timestamp,
-            'value': 40.0,
-            'comment': 'Manual entry',
-            'id': 'test1'
-        }]
-
-        self.api.get_goal_data.return_value = meditation_data
-        self.api.add_datapoint.return_value = True
-
-        check_and_add_qualifying_meditation(self.api, self.db)
-
-        # Should add to both database and Beeminder
-        self.assertEqual(len(self.db.get_datapoints()), 1)
-        self.api.add_datapoint.assert_called_once()
-
-    @patch('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
-    def test_api_failure(self):
-        """Test handling of API failure"""
-        meditation_data = [{
-            'timestamp': 1758945599,
-            'value': 45.0,
-            'comment': 'Auto-entered via Apple Health',
-            'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS',
-            'id': 'test1'
-        }]
-
-        self.api.get_goal_data.return_value = meditation_data
-        self.api.add_datapoint.return_value = False  # API failure
-
-        check_and_add_qualifying_meditation(self.api, self.db)
-
-        # Should add to database but not count as success
-        self.assertEqual(len(self.db.get_datapoints()), 1)
-
-    @patch('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
-    def test_multiple_meditations_same_day(self):
-        """Test multiple qualifying meditations on same day (should pick longest)"""
-        meditation_data = [
-            {
-                'timestamp': 1758945599,
-                'value': 35.0,
-                'comment': 'Auto-entered via Apple Health',
-                'fulltext': '2025-Sep-26 entered at 07:21 by zarathustra via BeemiOS',
-                'id': 'test1'
-            },
-            {
-                'timestamp': 1758946000,
-                'value': 50.0,  # Longer meditation
-                'comment': 'Auto-entered via Apple Health',
-                'fulltext': '2025-Sep-26 entered at 08:00 by zarathustra via BeemiOS',
-                'id': 'test2'
-            }
-        ]
-
-        self.api.get_goal_data.return_value = meditation_data
-        self.api.add_datapoint.return_value = True
-
-        check_and_add_qualifying_meditation(self.api, self.db)
-
-        # Should add only one (the longer one)
-        self.assertEqual(len(self.db.get_datapoints()), 1)
-        added_datapoint = self.db.get_datapoints()[0]
-        self.assertIn('50.0 minutes', added_datapoint['comment'])
-
-
-class TestMain(unittest.TestCase):
-    """Test main function"""
-
-    @patch('beeminder_sync.BEEMINDER_AUTH_TOKEN', 'test_token')
-    @patch('beeminder_sync.BEEMINDER_USERNAME', 'test_user')
-    @patch('beeminder_sync.BEEMINDER_GOAL_SLUG', 'test_goal')
-    @patch('beeminder_sync.DB_PATH')
-    @patch('beeminder_sync.check_and_add_qualifying_meditation')
-    @patch('beeminder_sync.sync_beeminder_with_database')
-    @patch('beeminder_sync.MeditationDatabase')
-    @patch('beeminder_sync.BeeminderAPI')
-    def test_main_success(self, mock_api_class, mock_db_class, mock_sync, mock_check, mock_db_path):
-        """Test successful main execution"""
-        mock_api = Mock()
-        mock_db = Mock()
-        mock_api_class.return_value = mock_api
-        mock_db_class.return_value = mock_db
+    result = extract_actual_time_from_apple_health(datapoint)
 
+    assert result is None
+
+
+@pytest.fixture
+def api_stub():
+    """Fresh recording BeeminderAPI stand-in"""
+    return _ApiStub()
+
+
+# sync_beeminder_with_database
+
+@pytest.mark.parametrize("beeminder_data, local_data, expected_deletes, expected_adds", [
+    pytest.param([{'timestamp': 123, 'value': 1.0, 'id': 't1'}],
+                 [(1.0, 123, 'test')],
+                 [], [], id="identical"),
+    pytest.param([{'timestamp': 123, 'value': 1.0, 'id': 't1'}, {'timestamp': 456, 'value': 2.0, 'id': 't2'}],
+                 [(1.0, 123, 'test')],
+                 [('test-goal', 't2')], [], id="delete_extra"),
+    pytest.param([{'timestamp': 123, 'value': 1.0, 'id': 't1'}],
+                 [(1.0, 123, 't1'), (2.0, 456, 't2')],
+                 [], [('test-goal', 2.0, 456, 't2')], id="add_missing"),
+    pytest.param([],
+                 [],
+                 [], [], id="both_empty"),
+    pytest.param([],
+                 [(1.0, 123, 't1'), (2.0, 456, 't2')],
+                 [], [('test-goal', 1.0, 123, 't1'), ('test-goal', 2.0, 456, 't2')], id="empty_goal"),
+])
+def test_sync(db, api_stub, beeminder_data, local_data, expected_deletes, expected_adds):
+    """Test which datapoints sync deletes from and adds to Beeminder"""
+    api_stub.goal_data = beeminder_data
+    for value, timestamp, comment in local_data:
+        db.add_datapoint(value, timestamp, comment)
+
+    sync_beeminder_with_database(api_stub, db, 'test-goal')
+
+    assert api_stub.calls_to('delete_datapoint') == expected_deletes
+    assert api_stub.calls_to('add_datapoint') == expected_adds
+
+
+def test_sync_api_failure(db, api_stub):
+    """Test sync keeps going when individual Beeminder requests fail"""
+    api_stub.goal_data = [{'timestamp': 789, 'value': 3.0, 'id': 'test3'}]
+    api_stub.delete_ok = False
+    api_stub.add_ok = False
+    db.add_datapoint(1.0, 123, 'test1')
+    db.add_datapoint(2.0, 456, 'test2')
+
+    sync_beeminder_with_database(api_stub, db, 'test-goal')
+
+    assert api_stub.calls_to('delete_datapoint') == [('test-goal', 'test3')]
+    assert len(api_stub.calls_to('add_datapoint')) == 2
+
+
+def test_sync_prefetched_data(db, api_stub):
+    """Test sync uses prefetched goal data instead of fetching it"""
+    db.add_datapoint(1.0, 123, 'test')
+
+    sync_beeminder_with_database(api_stub, db, 'test-goal',
+                                 beeminder_data=[{'timestamp': 123, 'value': 1.0, 'id': 'test1'}])
+
+    assert api_stub.calls == []
+
+
+class _CountingDatapoint(dict):
+    """Datapoint that counts how often its fields are read"""
+
+    reads = 0
+
+    def __getitem__(self, key):
+        type(self).reads += 1
+        return super().__getitem__(key)
+
+
+@pytest.mark.parametrize("n", [10, 1000, 10000])
+def test_sync_scales_linearly(db, api_stub, monkeypatch, n):
+    """Test sync reads each Beeminder datapoint a bounded number of times"""
+    monkeypatch.setattr(_CountingDatapoint, 'reads', 0)
+    # Half the datapoints are on both sides, a quarter only on each side
+    beeminder_data = [_CountingDatapoint(timestamp=i, value=30.0, id=f'b{i}') for i in range(n * 3 // 4)]
+    for i in range(n // 4, n):
+        db.add_datapoint(30.0, i, f'l{i}')
+
+    # A one-shot iterator: the datapoints can only be walked once
+    sync_beeminder_with_database(api_stub, db, 'test-goal', beeminder_data=iter(beeminder_data))
+
+    assert len(api_stub.calls_to('delete_datapoint')) == n // 4
+    assert len(api_stub.calls_to('add_datapoint')) == n - n * 3 // 4
+    # Timestamp and value to index every datapoint, plus the id of each deleted
+    # one; a scan per local datapoint would read fields O(n^2) times
+    assert _CountingDatapoint.reads == 2 * len(beeminder_data) + n // 4
+
+
+# check_and_add_qualifying_meditation
+
+# Run time shortly after the 2025-09-26 fixtures were entered
+_NOW = datetime(2025, 9, 26, 8, 35, tzinfo=NYC_TZ)
+
+
+@pytest.fixture
+def goal_slugs(monkeypatch):
+    """Source and target goal slugs for the meditation check"""
+    monkeypatch.setattr('beeminder_sync.BEEMINDER_SOURCE_GOAL', 'source-goal')
+    monkeypatch.setattr('beeminder_sync.BEEMINDER_GOAL_SLUG', 'target-goal')
+
+
+@pytest.mark.parametrize("meditation_data, pre_add, api_ok, expected_db_len, add_called, comment_substr", [
+    pytest.param(_APPLE_HEALTH_QUALIFYING, False, True, 1, True, '45.0 minutes',
+                 id="apple_health_qualifying"),
+    pytest.param(_APPLE_HEALTH_AFTERNOON, False, True, 0, False, None,
+                 id="non_qualifying_time"),
+    pytest.param(_APPLE_HEALTH_TOO_SHORT, False, True, 0, False, None,
+                 id="non_qualifying_duration"),
+    pytest.param(_APPLE_HEALTH_QUALIFYING, True, True, 1, False, 'Already there',
+                 id="already_recorded"),
+    # The database keeps the meditation even when Beeminder rejects it
+    pytest.param(_APPLE_HEALTH_QUALIFYING, False, False, 1, True, '45.0 minutes',
+                 id="api_failure"),
+    # Only the longest meditation of the day is recorded
+    pytest.param(_APPLE_HEALTH_SAME_DAY, False, True, 1, True, '50.0 minutes',
+                 id="multiple_same_day_picks_longest"),
+])
+def test_check_and_add(goal_slugs, db, api_stub, meditation_data, pre_add, api_ok,
+                       expected_db_len, add_called, comment_substr):
+    """Test which source meditations are recorded as early meditations"""
+    if pre_add:
+        db.add_datapoint(1, 1758945599, 'Already there')
+    api_stub.goal_data = meditation_data
+    api_stub.add_ok = api_ok
+
+    check_and_add_qualifying_meditation(api_stub, db, now=_NOW)
+
+    assert len(db.get_datapoints()) == expected_db_len
+    assert len(api_stub.calls_to('add_datapoint')) == (1 if add_called else 0)
+    if comment_substr:
+        assert comment_substr in db.get_datapoints()[0]['comment']
+
+
+def test_regular_entry_qualifying(goal_slugs, db, api_stub):
+    """Test regular (non-Apple Health) qualifying meditation"""
+    # 7:00 AM on the day of _NOW, so the result never depends on the wall clock
+    morning_timestamp = int(_NOW.replace(hour=7, minute=0).timestamp())
+
+    api_stub.goal_data = [{
+        'timestamp': morning_timestamp,
+        'value': 40.0,
+        'comment': 'Manual entry',
+        'id': 'test1'
+    }]
+
+    check_and_add_qualifying_meditation(api_stub, db, now=_NOW)
+
+    # Should add to both database and Beeminder
+    assert len(db.get_datapoints()) == 1
+    assert len(api_stub.calls_to('add_datapoint')) == 1
+
+
+def test_old_entries_skipped(goal_slugs, db, api_stub):
+    """Test entries from before the lookback window are ignored"""
+    api_stub.goal_data = _APPLE_HEALTH_QUALIFYING
+
+    # Three days later the entry falls outside LOOKBACK_DAYS
+    check_and_add_qualifying_meditation(api_stub, db, now=datetime(2025, 9, 29, 8, 35, tzinfo=NYC_TZ))
+
+    assert len(db.get_datapoints()) == 0
+    assert api_stub.calls_to('add_datapoint') == []
+
+
+# main
+
+def test_main_success():
+    """Test successful main execution"""
+    with patch.multiple('beeminder_sync',
+                        BEEMINDER_AUTH_TOKEN='test_token',
+                        BEEMINDER_USERNAME='test_user',
+                        BEEMINDER_GOAL_SLUG='test_goal',
+                        DB_PATH=DEFAULT,
+                        HTTP_CACHE_PATH=DEFAULT,
+                        load_http_cache=DEFAULT,
+                        save_http_cache=DEFAULT,
+                        check_and_add_qualifying_meditation=DEFAULT,
+                        sync_beeminder_with_database=DEFAULT,
+                        MeditationDatabase=DEFAULT,
+                        BeeminderAPI=DEFAULT) as mocks:
+        main()
+
+    mock_api = mocks['BeeminderAPI'].return_value
+    mock_db = mocks['MeditationDatabase'].return_value
+    mocks['load_http_cache'].assert_called_once_with(mocks['HTTP_CACHE_PATH'])
+    mocks['BeeminderAPI'].assert_called_once_with('test_user', 'test_token',
+                                                  mocks['load_http_cache'].return_value)
+    mocks['MeditationDatabase'].assert_called_once_with(mocks['DB_PATH'])
+    prefetched = mock_api.prefetch.return_value.result.return_value
+    assert mock_api.prefetch.call_count == 2
+    mocks['sync_beeminder_with_database'].assert_called_once_with(
+        mock_api, mock_db, 'test_goal', beeminder_data=prefetched)
+    mocks['check_and_add_qualifying_meditation'].assert_called_once_with(
+        mock_api, mock_db, meditation_data=prefetched)
+    mock_db.save.assert_called_once()
+    mocks['save_http_cache'].assert_called_once_with(mocks['HTTP_CACHE_PATH'], mock_api.http_cache)
+
+
+@pytest.mark.parametrize("log_level, expected", [
+    pytest.param('DEBUG', logging.DEBUG, id="known"),
+    pytest.param('VERBOSE', logging.INFO, id="unknown_falls_back_to_info"),
+])
+def test_main_log_level(monkeypatch, log_level, expected):
+    """Test main configures logging from LOGLEVEL, falling back to INFO"""
+    monkeypatch.setattr('beeminder_sync.LOG_LEVEL', log_level)
+    monkeypatch.setattr('beeminder_sync.BEEMINDER_AUTH_TOKEN', None)
+
+    with patch('logging.basicConfig') as basic_config, pytest.raises(ValueError):
         main()
 
-        mock_api_class.assert_called_once_with('test_user', 'test_token')
-        mock_db_class.assert_called_once_with(mock_db_path)
-        mock_sync.assert_called_once_with(mock_api, mock_db, 'test_goal')
-        mock_check.assert_called_once_with(mock_api, mock_db)
-        mock_db.save.assert_called_once()
+    assert basic_config.call_args.kwargs['level'] == expected
 
-    @patch('beeminder_sync.BEEMINDER_AUTH_TOKEN', None)
-    def test_main_missing_auth_token(self):
-        """Test main with missing auth token"""
-        with self.assertRaises(ValueError) as context:
-            main()
 
-        self.assertIn('BEEMINDER_AUTH_TOKEN not set', str(context.exception))
+def test_main_missing_auth_token(monkeypatch):
+    """Test main with missing auth token"""
+    monkeypatch.setattr('beeminder_sync.BEEMINDER_AUTH_TOKEN', None)
 
+    with pytest.raises(ValueError, match='BEEMINDER_AUTH_TOKEN not set'):
+        main()
 
-if __name__ == '__main__':
-    # Run tests without coverage for now
-    print("Running comprehensive test suite...")
-    unittest.main(verbosity=2)
\ No newline at end of file